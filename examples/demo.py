@@ -3,6 +3,7 @@
 Interactive demo of Prisma AIRS security scanning
 """
 
+import asyncio
 import os
 import sys
 import json
@@ -10,9 +11,9 @@ import json
 # Add parent directory to path
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from prisma_airs_mcp_server import make_api_request, API_KEY, PROFILE, API_URL
+from prisma_airs_mcp_server import create_client, extract_threats, make_api_request, API_KEY, PROFILE, API_URL
 
-def demo():
+async def demo():
     print("🛡️  Prisma AIRS Security Demo")
     print("=" * 50)
     
@@ -48,44 +49,43 @@ def demo():
         }
     ]
     
-    for i, test in enumerate(test_cases, 1):
-        print(f"\nTest {i}: {test['name']}")
-        print(f"Prompt: \"{test['prompt']}\"")
-        
-        result = make_api_request("/v1/scan/sync/request", {
-            "tr_id": f"demo-{i}",
-            "ai_profile": {"profile_name": PROFILE},
-            "contents": [{
-                "prompt": test['prompt'],
-                "response": test['response']
-            }]
-        })
+    async with create_client() as client:
+        for i, test in enumerate(test_cases, 1):
+            await run_test_case(client, i, test)
+
+async def run_test_case(client, i, test):
+    print(f"\nTest {i}: {test['name']}")
+    print(f"Prompt: \"{test['prompt']}\"")
+    
+    result = await make_api_request(client, "/v1/scan/sync/request", {
+        "tr_id": f"demo-{i}",
+        "ai_profile": {"profile_name": PROFILE},
+        "contents": [{
+            "prompt": test['prompt'],
+            "response": test['response']
+        }]
+    })
+    
+    if 'error' not in result:
+        verdict = result.get('category', 'unknown')
+        action = result.get('action', 'unknown')
         
-        if 'error' not in result:
-            verdict = result.get('category', 'unknown')
-            action = result.get('action', 'unknown')
-            
-            # Color code the verdict
-            if verdict == "malicious":
-                verdict_display = f"\033[91m{verdict}\033[0m"  # Red
-                action_display = f"\033[91m{action}\033[0m"
-            else:
-                verdict_display = f"\033[92m{verdict}\033[0m"  # Green
-                action_display = f"\033[92m{action}\033[0m"
-            
-            print(f"Result: {verdict_display} (action: {action_display})")
-            
-            # Show threats if any
-            threats = []
-            if result.get('prompt_detected'):
-                threats.extend([f"prompt:{k}" for k, v in result['prompt_detected'].items() if v])
-            if result.get('response_detected'):
-                threats.extend([f"response:{k}" for k, v in result['response_detected'].items() if v])
-            
-            if threats:
-                print(f"Threats: {', '.join(threats)}")
+        # Color code the verdict
+        if verdict == "malicious":
+            verdict_display = f"\033[91m{verdict}\033[0m"  # Red
+            action_display = f"\033[91m{action}\033[0m"
         else:
-            print(f"Error: {result['error']}")
+            verdict_display = f"\033[92m{verdict}\033[0m"  # Green
+            action_display = f"\033[92m{action}\033[0m"
+        
+        print(f"Result: {verdict_display} (action: {action_display})")
+        
+        # Show threats if any
+        threats = extract_threats(result.get('prompt_detected'), result.get('response_detected'))
+        if threats:
+            print(f"Threats: {', '.join(threats)}")
+    else:
+        print(f"Error: {result['error']}")
 
 if __name__ == "__main__":
-    demo()
+    asyncio.run(demo())
@@ -5,29 +5,34 @@ Real-time AI security scanning for Claude Desktop
 """
 
 import asyncio
+import functools
+import hashlib
 import json
 import os
+import secrets
+import socket
+import ssl
 import sys
-import uuid
+import time
 import logging
 from contextlib import asynccontextmanager
-from typing import Any, Dict, List, Optional, TypedDict
+from typing import Any, Dict, List, Optional, Tuple, TypedDict, Union
 
 # Handle SSL based on Python version
 if sys.version_info >= (3, 10):
     # Python 3.10+ - use truststore for proper SSL
     import truststore
-    truststore.inject_into_ssl()
     SSL_MODE = "truststore"
     VERIFY_SSL = True
 else:
-    # Python < 3.10 - disable SSL warnings
-    import urllib3
-    urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
+    # Python < 3.10 - skip certificate verification
     SSL_MODE = "bypass"
     VERIFY_SSL = False
 
-import requests
+import httpx
+import msgspec
+import orjson
+from cachetools import TTLCache
 from dotenv import load_dotenv
 from fastmcp import FastMCP
 
@@ -36,69 +41,324 @@ load_dotenv()
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# Initialize FastMCP
-mcp = FastMCP("prisma-airs-mcp")
+def _env_int(name: str, default: int) -> int:
+    """Read an integer setting, falling back to the default on a malformed value"""
+    value = os.getenv(name)
+    if value is None:
+        return default
+    try:
+        return int(value)
+    except ValueError:
+        logger.warning("⚠️  Invalid %s=%r, using default %s", name, value, default)
+        return default
 
 # Configuration
 API_KEY = os.getenv("PAN_AIRS_API_KEY")
 PROFILE = os.getenv("PAN_AIRS_PROFILE", "default")
 API_URL = os.getenv("PAN_AIRS_API_URL", "https://service.api.aisecurity.paloaltonetworks.com")
+CACHE_TTL = _env_int("PAN_AIRS_CACHE_TTL", 3600)
 
 # Constants
 MAX_NUMBER_OF_BATCH_SCAN_OBJECTS = 5
 MAX_NUMBER_OF_SCAN_IDS = 20
+SCAN_CACHE_SIZE = 4096
+MAX_CONCURRENT_BATCH_REQUESTS = 20
+CIRCUIT_FAILURE_THRESHOLD = 5
+CIRCUIT_RESET_SECONDS = 30.0
+
+# Request invariants, built once instead of per call
+_HEADERS = {
+    "Content-Type": "application/json",
+    "Accept": "application/json",
+    "Accept-Encoding": "gzip, br",
+    "x-pan-token": API_KEY or "",
+    "User-Agent": "PAN-AI-Security-MCP/1.0"
+}
+_AI_PROFILE = {"profile_name": PROFILE}
+
+# Verdict cache for repeated prompt/response pairs
+_scan_cache: TTLCache = TTLCache(maxsize=SCAN_CACHE_SIZE, ttl=CACHE_TTL)
 
 # Type definitions
 class SimpleScanContent(TypedDict):
     prompt: str
     response: str
 
+class ScanResult(msgspec.Struct):
+    """Fields of a scan response used by the tools; other fields are ignored"""
+    scan_id: Optional[str] = None
+    category: str = "unknown"
+    action: str = "unknown"
+    prompt_detected: Optional[Dict[str, Any]] = None
+    response_detected: Optional[Dict[str, Any]] = None
+
+_scan_result_decoder = msgspec.json.Decoder(ScanResult)
+
+class AppState:
+    """Runtime state shared across tool calls"""
+    client: Optional[httpx.AsyncClient] = None
+    batch_semaphore: Optional[asyncio.Semaphore] = None
+    prewarm_task: Optional[asyncio.Task] = None
+
+app_state = AppState()
+
+@functools.lru_cache(maxsize=None)
+def get_ssl_context() -> Union[ssl.SSLContext, bool]:
+    """
+    Build the SSL context shared by every HTTP client
+    
+    Loading the system trust store is expensive, so it is done once on
+    first use rather than at import time or per connection pool.
+    """
+    if not VERIFY_SSL:
+        return False
+    return truststore.SSLContext(ssl.PROTOCOL_TLS_CLIENT)
+
+def create_client() -> httpx.AsyncClient:
+    """
+    Create the shared async HTTP client
+    
+    A single HTTP/2 client lets concurrent scans multiplex over one
+    TLS connection instead of each paying for its own handshake. Idle
+    connections are kept for a minute so bursts of scans separated by
+    short pauses do not reconnect.
+    """
+    transport = httpx.AsyncHTTPTransport(
+        http2=True,
+        verify=get_ssl_context(),
+        retries=2,
+        limits=httpx.Limits(
+            max_connections=100,
+            max_keepalive_connections=20,
+            keepalive_expiry=60.0
+        ),
+        socket_options=[(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)]
+    )
+    return httpx.AsyncClient(
+        base_url=API_URL,
+        headers=_HEADERS,
+        timeout=30.0,
+        transport=transport
+    )
+
+async def prewarm_connection(client: httpx.AsyncClient) -> None:
+    """
+    Open a pooled connection to the API before the first scan arrives
+    
+    A HEAD request is enough to complete the TCP and TLS handshakes and
+    leave the connection in the pool. Unlike a throwaway scan, it does not
+    consume scan quota or appear in scan logs. Failures are ignored; the
+    first real scan will simply connect on its own.
+    """
+    try:
+        await client.head("/")
+    except httpx.HTTPError as e:
+        logger.debug("Connection prewarm failed: %s", e)
+
 @asynccontextmanager
 async def lifespan(mcp: FastMCP):
     """Lifespan manager for the MCP server"""
     logger.info("🚀 Palo Alto Networks Prisma AIRS MCP Server")
-    logger.info(f"📍 Profile: {PROFILE}")
-    logger.info(f"🌐 Endpoint: {API_URL}")
-    logger.info(f"🔒 SSL Mode: {SSL_MODE}")
-    logger.info(f"🐍 Python: {sys.version.split()[0]}")
+    logger.info("📍 Profile: %s", PROFILE)
+    logger.info("🌐 Endpoint: %s", API_URL)
+    logger.info("🔒 SSL Mode: %s", SSL_MODE)
+    logger.info("🐍 Python: %s", sys.version.split()[0])
     
     if not API_KEY:
         logger.warning("⚠️  No API key found! Set PAN_AIRS_API_KEY in .env file")
     
-    yield
-    logger.info("👋 Shutting down Prisma AIRS MCP Server...")
+    app_state.client = create_client()
+    app_state.batch_semaphore = asyncio.Semaphore(MAX_CONCURRENT_BATCH_REQUESTS)
+    if API_KEY:
+        app_state.prewarm_task = asyncio.create_task(prewarm_connection(app_state.client))
+    try:
+        yield
+    finally:
+        logger.info("👋 Shutting down Prisma AIRS MCP Server...")
+        if app_state.prewarm_task is not None:
+            app_state.prewarm_task.cancel()
+            app_state.prewarm_task = None
+        await app_state.client.aclose()
+        app_state.client = None
+
+# Initialize FastMCP
+mcp = FastMCP("prisma-airs-mcp", lifespan=lifespan)
+
+class CircuitBreaker:
+    """
+    Fail fast on an endpoint after repeated consecutive failures
+    
+    Once CIRCUIT_FAILURE_THRESHOLD calls in a row have failed, calls are
+    rejected without touching the network for CIRCUIT_RESET_SECONDS.
+    After the cooldown the next call is let through; another failure
+    reopens the circuit immediately and any success closes it.
+    """
+    
+    def __init__(
+        self,
+        failure_threshold: int = CIRCUIT_FAILURE_THRESHOLD,
+        reset_seconds: float = CIRCUIT_RESET_SECONDS
+    ):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.failure_count = 0
+        self.open_until = 0.0
+    
+    def is_open(self) -> bool:
+        return time.monotonic() < self.open_until
+    
+    def record_success(self) -> None:
+        self.failure_count = 0
+        self.open_until = 0.0
+    
+    def record_failure(self) -> None:
+        self.failure_count += 1
+        if self.failure_count >= self.failure_threshold:
+            self.open_until = time.monotonic() + self.reset_seconds
+
+_circuit_breakers: Dict[str, CircuitBreaker] = {}
 
-mcp.lifespan = lifespan
+def _is_ssl_error(exc: BaseException) -> bool:
+    """Check whether an HTTP error was caused by an SSL failure"""
+    while exc is not None:
+        if isinstance(exc, ssl.SSLError):
+            return True
+        exc = exc.__cause__ or exc.__context__
+    return False
 
-def make_api_request(endpoint: str, payload: Dict, timeout: int = 30) -> Dict[str, Any]:
+def _encode_json(payload: Any) -> bytes:
+    """Serialize a request body, falling back to stdlib json for strings orjson rejects"""
+    try:
+        return orjson.dumps(payload)
+    except orjson.JSONEncodeError:
+        # e.g. lone surrogates, which stdlib json escapes as \uXXXX
+        return json.dumps(payload).encode()
+
+async def make_api_request(
+    client: httpx.AsyncClient,
+    endpoint: str,
+    payload: Optional[Dict] = None,
+    method: str = "POST",
+    params: Optional[Dict[str, str]] = None,
+    decoder: Optional[msgspec.json.Decoder] = None
+) -> Any:
     """
     Make API request with appropriate SSL handling
+    
+    The response is decoded with orjson unless a typed msgspec decoder is
+    given. Failures are always returned as an error dictionary.
     """
-    headers = {
-        "Content-Type": "application/json",
-        "Accept": "application/json",
-        "x-pan-token": API_KEY,
-        "User-Agent": "PAN-AI-Security-MCP/1.0"
-    }
+    breaker = _circuit_breakers.get(endpoint)
+    if breaker is None:
+        breaker = _circuit_breakers[endpoint] = CircuitBreaker()
+    if breaker.is_open():
+        return {"error": "circuit_open", "success": False}
+    
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("%s %s params=%s payload=%s", method, endpoint, params, payload)
     
     try:
-        response = requests.post(
-            f"{API_URL}{endpoint}",
-            headers=headers,
-            json=payload,
-            verify=VERIFY_SSL,
-            timeout=timeout
+        response = await client.request(
+            method,
+            endpoint,
+            content=_encode_json(payload) if payload is not None else None,
+            params=params
         )
         response.raise_for_status()
-        return response.json()
-    except requests.exceptions.SSLError as e:
-        logger.error(f"SSL Error: {e}")
-        if SSL_MODE == "truststore":
-            logger.info("Try updating your system certificates or upgrading Python")
-        return {"error": f"SSL Error: {str(e)}", "success": False}
-    except requests.exceptions.RequestException as e:
-        logger.error(f"API request failed: {e}")
+        breaker.record_success()
+        if decoder is not None:
+            return decoder.decode(response.content)
+        return orjson.loads(response.content)
+    except httpx.HTTPError as e:
+        # Client errors such as a bad API key are not an outage
+        if not (isinstance(e, httpx.HTTPStatusError) and e.response.status_code < 500):
+            breaker.record_failure()
+        if _is_ssl_error(e):
+            logger.error("SSL Error: %s", e)
+            if SSL_MODE == "truststore":
+                logger.info("Try updating your system certificates or upgrading Python")
+            return {"error": f"SSL Error: {str(e)}", "success": False}
+        logger.error("API request failed: %s", e)
         return {"error": str(e), "success": False}
+    except ValueError as e:
+        logger.error("API request failed: %s", e)
+        return {"error": f"Invalid JSON response: {str(e)}", "success": False}
+
+def build_batch_payload(scan_objects: List[SimpleScanContent], start: int = 0) -> Dict[str, Any]:
+    """
+    Build an async batch scan payload
+    
+    Each object's req_id is its index offset by start, so batches split
+    from one list keep the object's position in that list. The whole
+    batch shares a single transaction ID.
+    """
+    tr_id = secrets.token_hex(16)
+    scan_requests = []
+    for i, obj in enumerate(scan_objects, start):
+        scan_requests.append({
+            "req_id": i,  # Must be integer
+            "scan_req": {  # Must be "scan_req" not "scan_request"
+                "tr_id": tr_id,
+                "ai_profile": _AI_PROFILE,
+                "contents": [{
+                    "prompt": obj["prompt"],
+                    "response": obj["response"]
+                }]
+            }
+        })
+    return {"scan_objects": scan_requests}
+
+def extract_threats(
+    prompt_detected: Optional[Dict[str, Any]],
+    response_detected: Optional[Dict[str, Any]]
+) -> List[str]:
+    """List detected threats as "prompt:<type>" / "response:<type>" entries"""
+    prompt_detected = prompt_detected or {}
+    response_detected = response_detected or {}
+    return (
+        [f"prompt:{threat}" for threat, detected in prompt_detected.items() if detected]
+        + [f"response:{threat}" for threat, detected in response_detected.items() if detected]
+    )
+
+def scan_cache_key(prompt: str, response: str) -> bytes:
+    """Hash a prompt/response pair together with the profile it is scanned under"""
+    # surrogatepass so lone surrogates from JSON clients hash instead of raising
+    return hashlib.sha256(
+        f"{PROFILE}\0{prompt}\0{response}".encode("utf-8", "surrogatepass")
+    ).digest()
+
+async def scan_prompt_response(prompt: str, response: str) -> Dict[str, Any]:
+    """Scan a prompt/response pair through the verdict cache and the sync endpoint"""
+    key = scan_cache_key(prompt, response)
+    cached = _scan_cache.get(key)
+    if cached is not None:
+        return {**cached, "threats": list(cached["threats"]), "cached": True}
+    
+    payload = {
+        "tr_id": secrets.token_hex(16),
+        "ai_profile": _AI_PROFILE,
+        "contents": [{"prompt": prompt, "response": response}]
+    }
+    result = await make_api_request(
+        app_state.client, "/v1/scan/sync/request", payload, decoder=_scan_result_decoder
+    )
+    
+    # Failures come back as error dictionaries rather than a ScanResult
+    if isinstance(result, dict):
+        return {"success": False, "error": result["error"]}
+    
+    # Extract and format results
+    scan_data = {
+        "success": True,
+        "scan_id": result.scan_id,
+        "verdict": result.category,
+        "action": result.action,
+        "threats": extract_threats(result.prompt_detected, result.response_detected)
+    }
+    
+    _scan_cache[key] = {**scan_data, "threats": list(scan_data["threats"])}
+    
+    return scan_data
 
 @mcp.tool()
 async def pan_inline_scan(prompt: str, response: str) -> Dict[str, Any]:
@@ -123,41 +383,9 @@ async def pan_inline_scan(prompt: str, response: str) -> Dict[str, Any]:
         - verdict: "benign" or "malicious"
         - action: "allow" or "block"
         - threats: List of detected threat types
+        - cached: Present and true when the verdict came from the local cache
     """
-    payload = {
-        "tr_id": str(uuid.uuid4()),
-        "ai_profile": {"profile_name": PROFILE},
-        "contents": [{"prompt": prompt, "response": response}]
-    }
-    
-    result = await asyncio.get_event_loop().run_in_executor(
-        None, make_api_request, "/v1/scan/sync/request", payload
-    )
-    
-    if "error" in result:
-        return {"success": False, "error": result["error"]}
-    
-    # Extract and format results
-    scan_data = {
-        "success": True,
-        "scan_id": result.get("scan_id"),
-        "verdict": result.get("category", "unknown"),
-        "action": result.get("action", "unknown"),
-        "threats": []
-    }
-    
-    # Extract specific threats
-    if result.get("prompt_detected"):
-        for threat, detected in result["prompt_detected"].items():
-            if detected:
-                scan_data["threats"].append(f"prompt:{threat}")
-    
-    if result.get("response_detected"):
-        for threat, detected in result["response_detected"].items():
-            if detected:
-                scan_data["threats"].append(f"response:{threat}")
-    
-    return scan_data
+    return await scan_prompt_response(prompt, response)
 
 @mcp.tool()
 async def pan_batch_scan(scan_objects: List[SimpleScanContent]) -> Dict[str, Any]:
@@ -168,49 +396,93 @@ async def pan_batch_scan(scan_objects: List[SimpleScanContent]) -> Dict[str, Any
     or multiple interactions at once.
     
     Args:
-        scan_objects: List of prompt/response pairs (max 5)
+        scan_objects: List of prompt/response pairs
                      Each object should have 'prompt' and 'response' fields
+                     Lists longer than 5 are submitted as concurrent batches of 5
         
     Returns:
         Dictionary containing:
-        - success: Whether the batch scan was submitted successfully
-        - scan_ids: List of scan IDs for retrieving results later
+        - success: Whether every object was submitted successfully
+        - scan_ids: Scan ID for each object, in input order; None where
+          the object was not submitted
         - count: Number of scans submitted
+        - failed: Indices of the objects that were not submitted
+        - error: Present if any batch failed; the other batches are still submitted
     """
-    if len(scan_objects) > MAX_NUMBER_OF_BATCH_SCAN_OBJECTS:
-        return {
-            "success": False,
-            "error": f"Maximum {MAX_NUMBER_OF_BATCH_SCAN_OBJECTS} objects allowed per batch"
-        }
+    async def submit(start: int) -> Dict[str, Any]:
+        chunk = scan_objects[start:start + MAX_NUMBER_OF_BATCH_SCAN_OBJECTS]
+        async with app_state.batch_semaphore:
+            return await make_api_request(
+                app_state.client, "/v1/scan/async/request", build_batch_payload(chunk, start)
+            )
     
-    # Build batch request
-    scan_requests = []
-    for i, obj in enumerate(scan_objects):
-        scan_requests.append({
-            "req_id": i,  # Must be integer
-            "scan_req": {  # Must be "scan_req" not "scan_request"
-                "ai_profile": {"profile_name": PROFILE},
-                "contents": [{
-                    "prompt": obj["prompt"],
-                    "response": obj["response"]
-                }]
-            }
-        })
+    starts = range(0, len(scan_objects), MAX_NUMBER_OF_BATCH_SCAN_OBJECTS)
+    results = await asyncio.gather(*[submit(start) for start in starts])
     
-    payload = {"scan_objects": scan_requests}
+    scan_ids: List[Optional[str]] = [None] * len(scan_objects)
+    errors = []
+    for start, result in zip(starts, results):
+        if "error" in result:
+            errors.append(result["error"])
+            continue
+        end = min(start + MAX_NUMBER_OF_BATCH_SCAN_OBJECTS, len(scan_objects))
+        chunk_ids = result.get("scan_ids", [])[:end - start]
+        scan_ids[start:start + len(chunk_ids)] = chunk_ids
     
-    result = await asyncio.get_event_loop().run_in_executor(
-        None, make_api_request, "/v1/scan/async/request", payload
-    )
+    failed = [i for i, scan_id in enumerate(scan_ids) if scan_id is None]
+    response = {
+        "success": not failed,
+        "scan_ids": scan_ids,
+        "count": len(scan_objects) - len(failed),
+        "failed": failed
+    }
+    if errors:
+        response["error"] = errors[0]
+    return response
+
+async def fetch_scan_records(
+    endpoint: str, id_param: str, scan_ids: List[str], id_prefix: str = ""
+) -> Tuple[Dict[str, Any], List[str], Optional[str]]:
+    """
+    Fetch records for any number of scan IDs, MAX_NUMBER_OF_SCAN_IDS per request
     
-    if "error" in result:
-        return {"success": False, "error": result["error"]}
+    Chunks are fetched concurrently and merged into a single mapping of
+    scan_id to record; id_prefix is prepended to each ID in the request.
+    A failed chunk does not discard the records of the others. Returns the
+    mapping, the requested scan IDs that no record was returned for, and
+    the first error message (None if every request succeeded).
+    """
+    async def fetch(chunk: List[str]) -> Any:
+        async with app_state.batch_semaphore:
+            return await make_api_request(
+                app_state.client, endpoint, method="GET",
+                params={id_param: ",".join(f"{id_prefix}{scan_id}" for scan_id in chunk)}
+            )
     
-    return {
-        "success": True,
-        "scan_ids": result.get("scan_ids", []),
-        "count": len(result.get("scan_ids", []))
-    }
+    chunks = [
+        scan_ids[i:i + MAX_NUMBER_OF_SCAN_IDS]
+        for i in range(0, len(scan_ids), MAX_NUMBER_OF_SCAN_IDS)
+    ]
+    responses = await asyncio.gather(*[fetch(chunk) for chunk in chunks])
+    
+    records = {}
+    errors = []
+    for response in responses:
+        if isinstance(response, dict) and "error" in response:
+            errors.append(response["error"])
+            continue
+        if not isinstance(response, list):
+            logger.error("Unexpected response from %s: %r", endpoint, response)
+            errors.append(f"Unexpected response format from {endpoint}")
+            continue
+        for record in response:
+            if not isinstance(record, dict) or not record.get("scan_id"):
+                logger.warning("Skipping record without scan_id from %s: %r", endpoint, record)
+                continue
+            records[record["scan_id"]] = record
+    
+    missing = [scan_id for scan_id in scan_ids if scan_id not in records]
+    return records, missing, errors[0] if errors else None
 
 @mcp.tool()
 async def pan_get_scan_results(scan_ids: List[str]) -> Dict[str, Any]:
@@ -220,17 +492,25 @@ async def pan_get_scan_results(scan_ids: List[str]) -> Dict[str, Any]:
     Use this to get results from batch scans after submission.
     
     Args:
-        scan_ids: List of scan IDs to retrieve (max 20)
+        scan_ids: List of scan IDs to retrieve
+                 Up to 20 IDs are fetched per request; longer lists are fetched concurrently
         
     Returns:
-        Scan results for each ID including verdicts and threats
+        Dictionary containing:
+        - success: Whether a result was returned for every scan ID
+        - results: Mapping of scan ID to its status and scan result
+        - count: Number of results returned
+        - missing: Scan IDs no result was returned for
+        - error: Present if any request failed; results still holds the rest
     """
-    # Note: This endpoint implementation depends on API documentation
-    return {
-        "success": False,
-        "error": "Result retrieval endpoint not yet implemented",
-        "note": "This feature requires additional API endpoint documentation"
-    }
+    if not scan_ids:
+        return {"success": False, "error": "At least one scan ID is required"}
+    
+    records, missing, error = await fetch_scan_records("/v1/scan/results", "scan_ids", scan_ids)
+    result = {"success": not missing, "results": records, "count": len(records), "missing": missing}
+    if error:
+        result["error"] = error
+    return result
 
 @mcp.tool()
 async def pan_get_scan_reports(scan_ids: List[str]) -> Dict[str, Any]:
@@ -241,16 +521,57 @@ async def pan_get_scan_reports(scan_ids: List[str]) -> Dict[str, Any]:
     
     Args:
         scan_ids: List of scan IDs to get detailed reports for
+                 Up to 20 IDs are fetched per request; longer lists are fetched concurrently
         
     Returns:
-        Detailed threat analysis and recommendations
+        Dictionary containing:
+        - success: Whether a report was returned for every scan ID
+        - reports: Mapping of scan ID to its detailed threat report
+        - count: Number of reports returned
+        - missing: Scan IDs no report was returned for
+        - error: Present if any request failed; reports still holds the rest
     """
-    # Note: This endpoint implementation depends on API documentation
-    return {
-        "success": False,
-        "error": "Report retrieval endpoint not yet implemented",
-        "note": "This feature requires additional API endpoint documentation"
-    }
+    if not scan_ids:
+        return {"success": False, "error": "At least one scan ID is required"}
+    
+    # Report IDs are the scan ID prefixed with "R"
+    records, missing, error = await fetch_scan_records(
+        "/v1/scan/reports", "report_ids", scan_ids, id_prefix="R"
+    )
+    result = {"success": not missing, "reports": records, "count": len(records), "missing": missing}
+    if error:
+        result["error"] = error
+    return result
+
+@mcp.tool()
+async def pan_scan_and_report(prompt: str, response: str) -> Dict[str, Any]:
+    """
+    Scan a prompt/response pair and fetch its detailed report in one call
+    
+    Saves a round trip compared to calling pan_inline_scan and then
+    pan_get_scan_reports. Both requests share the pooled connection.
+    
+    Args:
+        prompt: The user's input message to scan
+        response: The AI's response message to scan
+        
+    Returns:
+        The same fields as pan_inline_scan, plus:
+        - report: Detailed threat report for the scan, if one was returned
+        - report_error: Present if the scan succeeded but no report was returned
+    """
+    scan_data = await scan_prompt_response(prompt, response)
+    if not scan_data["success"] or not scan_data["scan_id"]:
+        return scan_data
+    
+    scan_id = scan_data["scan_id"]
+    records, missing, error = await fetch_scan_records(
+        "/v1/scan/reports", "report_ids", [scan_id], id_prefix="R"
+    )
+    if missing:
+        return {**scan_data, "report": None, "report_error": error or "No report returned for scan"}
+    
+    return {**scan_data, "report": records[scan_id]}
 
 if __name__ == "__main__":
     if len(sys.argv) > 1 and sys.argv[1] == "test":
@@ -262,11 +583,15 @@ if __name__ == "__main__":
             print("❌ No API key found! Please set PAN_AIRS_API_KEY in .env file")
             sys.exit(1)
         
-        test_result = make_api_request("/v1/scan/sync/request", {
-            "tr_id": f"test-{uuid.uuid4()}",
-            "ai_profile": {"profile_name": PROFILE},
-            "contents": [{"prompt": "test", "response": "test"}]
-        })
+        async def run_test() -> Dict[str, Any]:
+            async with create_client() as client:
+                return await make_api_request(client, "/v1/scan/sync/request", {
+                    "tr_id": f"test-{secrets.token_hex(16)}",
+                    "ai_profile": _AI_PROFILE,
+                    "contents": [{"prompt": "test", "response": "test"}]
+                })
+        
+        test_result = asyncio.run(run_test())
         
         if "error" not in test_result:
             print("✅ Connection successful!")
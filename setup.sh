@@ -96,11 +96,11 @@ echo -e "\n${YELLOW}📦 Installing dependencies...${NC}"
 if [ "$USE_TRUSTSTORE" = true ]; then
     # Python 3.10+ with truststore
     pip install --quiet --index-url https://pypi.org/simple --trusted-host pypi.org:443 truststore
-    pip install --quiet requests python-dotenv fastmcp
+    pip install --quiet "httpx[http2,brotli]" cachetools msgspec orjson python-dotenv fastmcp
     echo -e "${GREEN}✅ Installed with truststore support${NC}"
 else
     # Python < 3.10 without truststore
-    pip install --quiet requests python-dotenv fastmcp urllib3
+    pip install --quiet "httpx[http2,brotli]" cachetools msgspec orjson python-dotenv fastmcp
     echo -e "${YELLOW}⚠️  Installed without truststore (using alternative SSL handling)${NC}"
 fi
 
@@ -112,6 +112,9 @@ cat > .env.example << 'ENVEOF'
 PAN_AIRS_API_KEY=your_api_key_here
 PAN_AIRS_PROFILE=your_profile_name
 PAN_AIRS_API_URL=https://service.api.aisecurity.paloaltonetworks.com
+
+# Optional: seconds to cache scan verdicts for repeated prompt/response pairs (0 disables)
+PAN_AIRS_CACHE_TTL=3600
 ENVEOF
 
 # Configure Claude Desktop
@@ -17,3 +17,495 @@ def test_ssl_mode():
         assert prisma_airs_mcp_server.SSL_MODE == "truststore"
     else:
         assert prisma_airs_mcp_server.SSL_MODE == "bypass"
+
+@pytest.fixture(autouse=True)
+def reset_circuit_breakers():
+    """Keep circuit breaker state from leaking between tests"""
+    import prisma_airs_mcp_server
+    prisma_airs_mcp_server._circuit_breakers.clear()
+    yield
+    prisma_airs_mcp_server._circuit_breakers.clear()
+
+def _mock_client(handler):
+    """Build an AsyncClient that routes requests to a local handler"""
+    import httpx
+    import prisma_airs_mcp_server
+    return httpx.AsyncClient(
+        base_url=prisma_airs_mcp_server.API_URL,
+        transport=httpx.MockTransport(handler)
+    )
+
+def test_make_api_request_success():
+    """Test that successful responses are decoded"""
+    import asyncio
+    import httpx
+    import prisma_airs_mcp_server
+
+    def handler(request):
+        assert request.url.path == "/v1/scan/sync/request"
+        return httpx.Response(200, json={"category": "benign", "action": "allow"})
+
+    async def run():
+        async with _mock_client(handler) as client:
+            return await prisma_airs_mcp_server.make_api_request(
+                client, "/v1/scan/sync/request", {"contents": []}
+            )
+
+    result = asyncio.run(run())
+    assert result == {"category": "benign", "action": "allow"}
+
+def test_make_api_request_http_error():
+    """Test that HTTP errors are returned as error dictionaries"""
+    import asyncio
+    import httpx
+    import prisma_airs_mcp_server
+
+    def handler(request):
+        return httpx.Response(503)
+
+    async def run():
+        async with _mock_client(handler) as client:
+            return await prisma_airs_mcp_server.make_api_request(
+                client, "/v1/scan/sync/request", {"contents": []}
+            )
+
+    result = asyncio.run(run())
+    assert result["success"] is False
+    assert "error" in result
+
+def _tool_fn(tool):
+    """Return the underlying coroutine function of an MCP tool"""
+    return getattr(tool, "fn", tool)
+
+@pytest.fixture
+def mock_app_state():
+    """
+    Install a mock client and semaphore on app_state
+    
+    Yields a function taking the request handler to install.
+    The previous state is restored and the verdict cache cleared afterwards.
+    """
+    import asyncio
+    import prisma_airs_mcp_server
+
+    state = prisma_airs_mcp_server.app_state
+    saved = (state.client, state.batch_semaphore)
+    clients = []
+
+    def install(handler):
+        clients.append(_mock_client(handler))
+        state.client = clients[-1]
+        state.batch_semaphore = asyncio.Semaphore(
+            prisma_airs_mcp_server.MAX_CONCURRENT_BATCH_REQUESTS
+        )
+
+    prisma_airs_mcp_server._scan_cache.clear()
+    yield install
+
+    for client in clients:
+        asyncio.run(client.aclose())
+    state.client, state.batch_semaphore = saved
+    prisma_airs_mcp_server._scan_cache.clear()
+
+def test_inline_scan_caches_verdicts(mock_app_state):
+    """Test that repeated inline scans are served from the verdict cache"""
+    import asyncio
+    import httpx
+    import prisma_airs_mcp_server
+
+    calls = []
+
+    def handler(request):
+        calls.append(request.url.path)
+        return httpx.Response(200, json={"scan_id": "abc", "category": "benign", "action": "allow"})
+
+    mock_app_state(handler)
+    scan = _tool_fn(prisma_airs_mcp_server.pan_inline_scan)
+    first = asyncio.run(scan("cache me", "ok"))
+    second = asyncio.run(scan("cache me", "ok"))
+    # An expired entry must fall through to a real scan
+    prisma_airs_mcp_server._scan_cache.clear()
+    third = asyncio.run(scan("cache me", "ok"))
+
+    assert len(calls) == 2
+    assert "cached" not in first
+    assert "cached" not in third
+    assert second["cached"] is True
+    assert second["verdict"] == first["verdict"]
+
+def test_concurrent_inline_scans_use_separate_transactions(mock_app_state):
+    """Test that concurrent inline scans each send their own transaction ID"""
+    import asyncio
+    import json
+    import httpx
+    import prisma_airs_mcp_server
+
+    tr_ids = []
+
+    def handler(request):
+        body = json.loads(request.content)
+        tr_ids.append(body["tr_id"])
+        return httpx.Response(200, json={"scan_id": body["contents"][0]["prompt"]})
+
+    mock_app_state(handler)
+    scan = _tool_fn(prisma_airs_mcp_server.pan_inline_scan)
+
+    async def run():
+        return await asyncio.gather(*[scan(f"prompt {i}", "ok") for i in range(3)])
+
+    results = asyncio.run(run())
+    assert [r["scan_id"] for r in results] == ["prompt 0", "prompt 1", "prompt 2"]
+    assert len(set(tr_ids)) == 3
+
+def test_batch_scan_chunks_large_requests(mock_app_state):
+    """Test that batches over the API limit are split and flattened in order"""
+    import asyncio
+    import json
+    import httpx
+    import prisma_airs_mcp_server
+
+    batch_sizes = []
+
+    def handler(request):
+        objects = json.loads(request.content)["scan_objects"]
+        batch_sizes.append(len(objects))
+        return httpx.Response(200, json={
+            "scan_ids": [o["scan_req"]["contents"][0]["prompt"] for o in objects]
+        })
+
+    mock_app_state(handler)
+    scan = _tool_fn(prisma_airs_mcp_server.pan_batch_scan)
+    result = asyncio.run(scan([{"prompt": f"p{i}", "response": "r"} for i in range(12)]))
+    assert result["success"] is True
+    assert result["scan_ids"] == [f"p{i}" for i in range(12)]
+    assert result["failed"] == []
+    assert sorted(batch_sizes) == [2, 5, 5]
+
+def test_batch_scan_keeps_positions_when_a_batch_fails(mock_app_state):
+    """Test that a failed middle batch leaves the other scan IDs at their input positions"""
+    import asyncio
+    import json
+    import httpx
+    import prisma_airs_mcp_server
+
+    req_ids = []
+
+    def handler(request):
+        objects = json.loads(request.content)["scan_objects"]
+        req_ids.extend(o["req_id"] for o in objects)
+        if objects[0]["req_id"] == 5:
+            return httpx.Response(503, json={"error": "unavailable"})
+        return httpx.Response(200, json={
+            "scan_ids": [o["scan_req"]["contents"][0]["prompt"] for o in objects]
+        })
+
+    mock_app_state(handler)
+    scan = _tool_fn(prisma_airs_mcp_server.pan_batch_scan)
+    result = asyncio.run(scan([{"prompt": f"p{i}", "response": "r"} for i in range(12)]))
+    assert result["success"] is False
+    assert "error" in result
+    assert result["scan_ids"] == [f"p{i}" for i in range(5)] + [None] * 5 + ["p10", "p11"]
+    assert result["failed"] == list(range(5, 10))
+    assert result["count"] == 7
+    assert sorted(req_ids) == list(range(12))
+
+def test_extract_threats():
+    """Test that only detected threats are listed, prompt first"""
+    import prisma_airs_mcp_server
+    result = {
+        "prompt_detected": {"injection": True, "url_cats": False},
+        "response_detected": {"dlp": True},
+    }
+    threats = prisma_airs_mcp_server.extract_threats(
+        result["prompt_detected"], result["response_detected"]
+    )
+    assert threats == ["prompt:injection", "response:dlp"]
+    assert prisma_airs_mcp_server.extract_threats(None, None) == []
+
+def test_make_api_request_invalid_json():
+    """Test that undecodable response bodies are returned as errors"""
+    import asyncio
+    import httpx
+    import prisma_airs_mcp_server
+
+    def handler(request):
+        return httpx.Response(200, content=b"<html>gateway</html>")
+
+    async def run():
+        async with _mock_client(handler) as client:
+            return await prisma_airs_mcp_server.make_api_request(
+                client, "/v1/scan/sync/request", {"contents": []}
+            )
+
+    result = asyncio.run(run())
+    assert result["success"] is False
+    assert result["error"].startswith("Invalid JSON response")
+
+def test_get_scan_results_chunks_ids(mock_app_state):
+    """Test that result lookups are split into requests of at most 20 IDs"""
+    import asyncio
+    import httpx
+    import prisma_airs_mcp_server
+
+    requested = []
+
+    def handler(request):
+        scan_ids = request.url.params["scan_ids"].split(",")
+        requested.append(len(scan_ids))
+        return httpx.Response(200, json=[
+            {"scan_id": scan_id, "status": "complete", "result": {"category": "benign"}}
+            for scan_id in scan_ids
+        ])
+
+    mock_app_state(handler)
+    scan_ids = [f"id-{i}" for i in range(45)]
+    get_results = _tool_fn(prisma_airs_mcp_server.pan_get_scan_results)
+    result = asyncio.run(get_results(scan_ids))
+    empty = asyncio.run(get_results([]))
+    assert result["success"] is True
+    assert result["count"] == 45
+    assert set(result["results"]) == set(scan_ids)
+    assert sorted(requested) == [5, 20, 20]
+    assert empty["success"] is False
+
+def test_ssl_context_is_shared():
+    """Test that every client reuses one SSL context"""
+    import prisma_airs_mcp_server
+    context = prisma_airs_mcp_server.get_ssl_context()
+    assert prisma_airs_mcp_server.get_ssl_context() is context
+    if sys.version_info < (3, 10):
+        assert context is False
+
+def test_scan_and_report_fetches_report_for_scan(mock_app_state):
+    """Test that the combined tool requests the report for the new scan ID"""
+    import asyncio
+    import httpx
+    import prisma_airs_mcp_server
+
+    def handler(request):
+        if request.url.path == "/v1/scan/sync/request":
+            return httpx.Response(200, json={"scan_id": "scan-1", "category": "benign"})
+        assert request.url.path == "/v1/scan/reports"
+        assert request.url.params["report_ids"] == "Rscan-1"
+        return httpx.Response(200, json=[
+            {"report_id": "Rscan-1", "scan_id": "scan-1", "detection_results": []}
+        ])
+
+    mock_app_state(handler)
+    scan_and_report = _tool_fn(prisma_airs_mcp_server.pan_scan_and_report)
+    result = asyncio.run(scan_and_report("report me", "ok"))
+    assert result["verdict"] == "benign"
+    assert result["report"]["report_id"] == "Rscan-1"
+
+def test_prewarm_connection_ignores_failures():
+    """Test that a failed prewarm request does not raise"""
+    import asyncio
+    import httpx
+    import prisma_airs_mcp_server
+
+    def handler(request):
+        raise httpx.ConnectError("unreachable", request=request)
+
+    async def run():
+        async with _mock_client(handler) as client:
+            await prisma_airs_mcp_server.prewarm_connection(client)
+
+    asyncio.run(run())
+
+def test_make_api_request_decodes_brotli():
+    """Test that brotli-compressed responses are transparently decoded"""
+    import asyncio
+    import brotli
+    import httpx
+    import prisma_airs_mcp_server
+
+    def handler(request):
+        assert "br" in request.headers["accept-encoding"]
+        return httpx.Response(
+            200,
+            headers={"content-encoding": "br"},
+            content=brotli.compress(b'{"category": "benign"}')
+        )
+
+    async def run():
+        async with httpx.AsyncClient(
+            base_url=prisma_airs_mcp_server.API_URL,
+            headers=prisma_airs_mcp_server._HEADERS,
+            transport=httpx.MockTransport(handler)
+        ) as client:
+            return await prisma_airs_mcp_server.make_api_request(
+                client, "/v1/scan/sync/request", {"contents": []}
+            )
+
+    assert asyncio.run(run()) == {"category": "benign"}
+
+def test_circuit_breaker_opens_after_repeated_failures():
+    """Test that an endpoint failing repeatedly is short-circuited"""
+    import asyncio
+    import httpx
+    import prisma_airs_mcp_server
+
+    calls = []
+
+    def handler(request):
+        calls.append(request.url.path)
+        return httpx.Response(503)
+
+    async def run():
+        async with _mock_client(handler) as client:
+            return [
+                await prisma_airs_mcp_server.make_api_request(
+                    client, "/v1/scan/sync/request", {"contents": []}
+                )
+                for _ in range(prisma_airs_mcp_server.CIRCUIT_FAILURE_THRESHOLD + 2)
+            ]
+
+    results = asyncio.run(run())
+
+    assert len(calls) == prisma_airs_mcp_server.CIRCUIT_FAILURE_THRESHOLD
+    assert results[-1] == {"error": "circuit_open", "success": False}
+
+def test_env_int_falls_back_on_malformed_value(monkeypatch):
+    """Test that a malformed integer setting uses the default instead of crashing"""
+    import prisma_airs_mcp_server
+    monkeypatch.setenv("PAN_AIRS_TEST_INT", "one hour")
+    assert prisma_airs_mcp_server._env_int("PAN_AIRS_TEST_INT", 3600) == 3600
+    monkeypatch.setenv("PAN_AIRS_TEST_INT", "60")
+    assert prisma_airs_mcp_server._env_int("PAN_AIRS_TEST_INT", 3600) == 60
+    monkeypatch.delenv("PAN_AIRS_TEST_INT")
+    assert prisma_airs_mcp_server._env_int("PAN_AIRS_TEST_INT", 3600) == 3600
+
+def test_get_scan_results_rejects_malformed_body(mock_app_state):
+    """Test that unexpected response shapes are returned as errors, not raised"""
+    import asyncio
+    import httpx
+    import prisma_airs_mcp_server
+
+    bodies = [{"results": []}, [{"report_id": "Rabc"}, {"scan_id": "abc", "status": "complete"}]]
+
+    def handler(request):
+        return httpx.Response(200, json=bodies.pop(0))
+
+    mock_app_state(handler)
+    get_results = _tool_fn(prisma_airs_mcp_server.pan_get_scan_results)
+    wrong_shape = asyncio.run(get_results(["abc"]))
+    missing_id = asyncio.run(get_results(["abc"]))
+    assert wrong_shape["success"] is False
+    assert "Unexpected response format" in wrong_shape["error"]
+    assert missing_id["success"] is True
+    assert list(missing_id["results"]) == ["abc"]
+    assert missing_id["missing"] == []
+
+def test_get_scan_results_keeps_partial_results(mock_app_state):
+    """Test that a failed chunk keeps the other records and lists every ID not returned"""
+    import asyncio
+    import httpx
+    import prisma_airs_mcp_server
+
+    def handler(request):
+        scan_ids = request.url.params["scan_ids"].split(",")
+        if "id-20" in scan_ids:
+            return httpx.Response(400, json={"error": "bad request"})
+        # The API omits id-3 without reporting an error
+        return httpx.Response(200, json=[
+            {"scan_id": scan_id, "status": "complete"}
+            for scan_id in scan_ids if scan_id != "id-3"
+        ])
+
+    mock_app_state(handler)
+    scan_ids = [f"id-{i}" for i in range(45)]
+    get_results = _tool_fn(prisma_airs_mcp_server.pan_get_scan_results)
+    result = asyncio.run(get_results(scan_ids))
+    assert result["success"] is False
+    assert "error" in result
+    assert result["count"] == 24
+    assert result["missing"] == ["id-3"] + [f"id-{i}" for i in range(20, 40)]
+    assert "id-0" in result["results"] and "id-44" in result["results"]
+
+def test_circuit_breaker_closes_after_cooldown():
+    """Test that calls resume once the cooldown passes and a success closes the circuit"""
+    import asyncio
+    import time
+    import httpx
+    import prisma_airs_mcp_server
+
+    statuses = [503, 503, 200]
+
+    def handler(request):
+        return httpx.Response(statuses.pop(0), json={"category": "benign"})
+
+    breaker = prisma_airs_mcp_server.CircuitBreaker(failure_threshold=2, reset_seconds=0.05)
+    prisma_airs_mcp_server._circuit_breakers["/v1/scan/sync/request"] = breaker
+
+    async def call(client):
+        return await prisma_airs_mcp_server.make_api_request(
+            client, "/v1/scan/sync/request", {"contents": []}
+        )
+
+    async def run():
+        async with _mock_client(handler) as client:
+            await call(client)
+            await call(client)
+            rejected = await call(client)
+            time.sleep(0.06)
+            return rejected, await call(client)
+
+    rejected, recovered = asyncio.run(run())
+    assert rejected == {"error": "circuit_open", "success": False}
+    assert recovered == {"category": "benign"}
+    assert not breaker.is_open()
+    assert breaker.failure_count == 0
+
+def test_circuit_breaker_ignores_client_errors():
+    """Test that 4xx responses such as a bad API key do not trip the circuit"""
+    import asyncio
+    import httpx
+    import prisma_airs_mcp_server
+
+    calls = []
+
+    def handler(request):
+        calls.append(request.url.path)
+        return httpx.Response(401)
+
+    async def run():
+        async with _mock_client(handler) as client:
+            return [
+                await prisma_airs_mcp_server.make_api_request(
+                    client, "/v1/scan/sync/request", {"contents": []}
+                )
+                for _ in range(prisma_airs_mcp_server.CIRCUIT_FAILURE_THRESHOLD + 2)
+            ]
+
+    results = asyncio.run(run())
+    assert len(calls) == prisma_airs_mcp_server.CIRCUIT_FAILURE_THRESHOLD + 2
+    assert all(result["error"] != "circuit_open" for result in results)
+
+def test_scan_cache_key_accepts_lone_surrogates():
+    """Test that prompts with lone surrogates still produce distinct cache keys"""
+    import prisma_airs_mcp_server
+    key = prisma_airs_mcp_server.scan_cache_key("smile \ud83d", "ok")
+    assert key == prisma_airs_mcp_server.scan_cache_key("smile \ud83d", "ok")
+    assert key != prisma_airs_mcp_server.scan_cache_key("smile \ud83e", "ok")
+
+def test_make_api_request_encodes_lone_surrogates():
+    """Test that payloads orjson cannot encode are still sent"""
+    import asyncio
+    import json
+    import httpx
+    import prisma_airs_mcp_server
+
+    sent = []
+
+    def handler(request):
+        sent.append(json.loads(request.content))
+        return httpx.Response(200, json={"category": "benign"})
+
+    async def run():
+        async with _mock_client(handler) as client:
+            return await prisma_airs_mcp_server.make_api_request(
+                client, "/v1/scan/sync/request", {"contents": [{"prompt": "\ud83d", "response": ""}]}
+            )
+
+    assert asyncio.run(run()) == {"category": "benign"}
+    assert sent[0]["contents"][0]["prompt"] == "\ud83d"